@@ -0,0 +1,53 @@
+import contextlib
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+
+def cache_dir():
+    """Returns the directory where ju keeps its cached data."""
+    root = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(root, 'ju')
+
+
+def ensure_dir(path):
+    """Creates the directory, which may be created concurrently by another
+    process or thread.
+    """
+    try:
+        os.makedirs(path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Holds an exclusive lock on `path` against other processes and threads."""
+    ensure_dir(os.path.dirname(path))
+    with open(path, 'a') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+def load_json(path, default=None):
+    """Reads a json cache file, returns `default` if it's missing or broken."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return default
+
+
+def dump_json(path, data):
+    """Writes a json cache file atomically."""
+    ensure_dir(os.path.dirname(path))
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
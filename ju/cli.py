@@ -1,5 +1,4 @@
 import os
-import sys
 
 import click
 from ju.config import Config
@@ -23,8 +22,6 @@ class ComplexCLI(click.MultiCommand):
 
     def import_command(self, ctx, name):
         try:
-            if sys.version_info[0] == 2:
-                name = name.encode('ascii', 'replace')
             mod = __import__(
                 'ju.commands.cmd_%s'%name, None, None, ['cli']
             )
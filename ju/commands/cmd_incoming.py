@@ -0,0 +1,60 @@
+import os
+import time
+
+import click
+import hglib
+from ju.decorators import pass_config_loop
+
+
+def show_incoming(cfg, hg, repo, fetch):
+    bundle = cfg.bundle_path(repo)
+    with cfg.bundle_lock(repo):
+        cached = not fetch and os.path.isfile(bundle)
+        if cached:
+            fetched_at = os.path.getmtime(bundle)
+            changesets = hg.incoming(path=cfg.enc(bundle))
+        else:
+            changesets = cfg.fetch_incoming(hg, repo)
+
+    cfg.out('\n======> {}({}) <======'.format(repo.name, cfg.dec(hg.branch())), fg='green')
+    if cached:
+        cfg.out('cached {}, {} ago (use --fetch to check the remote)'.format(
+            time.strftime('%Y-%m-%d %H:%M', time.localtime(fetched_at)),
+            format_age(time.time() - fetched_at),
+        ), fg='cyan', bold=False)
+    if not changesets:
+        cfg.out('no changes found')
+    for rev in changesets:
+        cfg.out('{}:{} {} {}'.format(
+            cfg.dec(rev.rev), cfg.dec(rev.node)[:12],
+            cfg.dec(rev.branch), cfg.dec(rev.author)
+        ), fg='yellow')
+        cfg.out('\t{}'.format(cfg.dec(rev.desc)), bold=False)
+
+
+def format_age(seconds):
+    for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= size:
+            return '{}{}'.format(int(seconds // size), unit)
+    return '{}s'.format(int(seconds))
+
+
+@click.command('incoming', short_help='Shows incoming changesets.')
+@click.option(
+    '-f',
+    '--fetch',
+    is_flag=True,
+    help='check the remote even if the changesets are cached'
+)
+@pass_config_loop
+def cli(cfg, repo, *args, **kwargs):
+    """Shows new changesets found in the default source without pulling.
+
+    Changesets are saved to a cached bundle which is listed by the next
+    runs and pulled by the next command that updates the repository.
+    """
+    hg = hglib.open(repo['path'])
+    try:
+        show_incoming(cfg, hg, repo, kwargs['fetch'])
+    finally:
+        hg.close()
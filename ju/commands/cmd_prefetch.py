@@ -0,0 +1,84 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import click
+import hglib
+from ju.decorators import pass_config
+
+
+def prefetch(cfg, repo):
+    """Pulls the repository, returns the number of new changesets."""
+    hg = hglib.open(repo['path'])
+    try:
+        with cfg.bundle_lock(repo):
+            # changesets already fetched by `ju watch` or `ju incoming`
+            applied = cfg.pull_bundle(hg, repo)
+            changesets = cfg.fetch_incoming(hg, repo)
+            if changesets and not cfg.pull_bundle(hg, repo):
+                hg.pull()
+        return applied + len(changesets)
+    finally:
+        hg.close()
+
+
+def run(cfg, repos, jobs):
+    schedule = cfg.schedule
+    with ThreadPoolExecutor(jobs) as executor:
+        futures = {executor.submit(prefetch, cfg, repo): repo for repo in repos}
+        for future in as_completed(futures):
+            repo = futures[future]
+            try:
+                changes = future.result()
+            except (hglib.error.ServerError, hglib.error.CommandError, OSError) as e:
+                schedule.record(repo.name, error=cfg.dec(str(e)))
+                cfg.err('{}: {}'.format(repo.name, e))
+            else:
+                schedule.record(repo.name, changes=changes)
+                cfg.out('{}: {} new changesets'.format(repo.name, changes), bold=False)
+            schedule.save()
+
+
+@click.command('prefetch', short_help='Pulls repositories ahead of time.')
+@click.option(
+    '-a',
+    '--all',
+    'everything',
+    is_flag=True,
+    help='pull all repositories, not only the due ones'
+)
+@click.option(
+    '-l',
+    '--loop',
+    is_flag=True,
+    help='keep running and pull repositories when they are due'
+)
+@click.option('-j', '--jobs', type=int, help='number of parallel pulls')
+@pass_config
+def cli(cfg, everything, loop, jobs):
+    """Pulls configured repositories in background, e.g. from cron.
+
+    Each repository is scheduled by how often it receives changes, so
+    other commands find it fresh and don't pull on their own.
+    """
+    jobs = jobs or int(cfg.prefetch_cfg.get('jobs', 4))
+    names = [repo.name for repo in cfg.repositores]
+    if not names:
+        return
+    try:
+        while True:
+            now = time.time()
+            due = [
+                repo for repo in cfg.repositores
+                if everything or cfg.schedule.is_due(repo.name, now)
+            ]
+            random.shuffle(due)
+            if due:
+                run(cfg, due, jobs)
+            if not loop:
+                break
+            everything = False
+            delay = cfg.schedule.next_run(names) - time.time()
+            time.sleep(min(max(delay, 1), cfg.schedule.max_interval))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,148 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+import hglib
+from ju.decorators import pass_config
+from ju.watcher import make_watcher, PollingWatcher
+
+STATUS_CODES = ('M', 'A', 'R', '!', '?')
+
+
+def local_state(cfg, hg):
+    """Branch and dirty counts, doesn't touch the network."""
+    counts = dict.fromkeys(STATUS_CODES, 0)
+    for code, name in hg.status():
+        code = cfg.dec(code)
+        if code in counts:
+            counts[code] += 1
+    return dict(branch=cfg.dec(hg.branch()), **counts)
+
+
+def remote_state(cfg, repo):
+    """Incoming and outgoing changesets count.
+
+    Runs in a worker thread, so it uses its own command server instead
+    of the one serving the local state.
+    """
+    errors = (hglib.error.ServerError, hglib.error.CommandError, OSError)
+    try:
+        hg = hglib.open(os.path.expanduser(repo['path']))
+    except errors:
+        return {'in': '-', 'out': '-'}
+    try:
+        with cfg.bundle_lock(repo):
+            incoming = cfg.fetch_incoming(hg, repo)
+        return {'in': len(incoming), 'out': len(hg.outgoing())}
+    except errors:
+        return {'in': '-', 'out': '-'}
+    finally:
+        try:
+            hg.close()
+        except errors:
+            pass
+
+
+def render(cfg, repos, rows):
+    click.clear()
+    cfg.out('ju watch: {}  (Ctrl+C to exit)\n'.format(time.strftime('%H:%M:%S')))
+    header = '{:<30} {:<20} ' + ' '.join(['{:>4}'] * len(STATUS_CODES)) + ' {:>4} {:>4}'
+    cfg.out(header.format('repository', 'branch', *(STATUS_CODES + ('in', 'out'))))
+    for key, repo in enumerate(repos):
+        row = rows[key]
+        if 'error' in row:
+            cfg.err('{:<30} {}'.format(repo.name, row['error']))
+            continue
+        values = [row.get(code, '') for code in STATUS_CODES]
+        line = header.format(
+            repo.name, row.get('branch', ''), *(values + [row.get('in', ''), row.get('out', '')])
+        )
+        dirty = any(values)
+        cfg.out(line, fg='yellow' if dirty else 'green', bold=False)
+
+
+@click.command('watch', short_help='Live status of all repositories.')
+@click.option(
+    '-r',
+    '--remote-interval',
+    default=300,
+    help='seconds between incoming/outgoing checks'
+)
+@click.option(
+    '--poll',
+    is_flag=True,
+    help='poll the working copies instead of inotify'
+)
+@click.option(
+    '-j',
+    '--jobs',
+    default=4,
+    help='number of parallel incoming/outgoing checks'
+)
+@pass_config
+def cli(cfg, remote_interval, poll, jobs):
+    """Shows a continuously updated status table of all repositories.
+
+    One hg command server is kept open per repository, and a repository
+    is queried again only when its working copy or dirstate changes.
+    """
+    clients = {}
+    rows = {}
+    watcher = make_watcher(poll)
+    for key, repo in enumerate(cfg.repositores):
+        path = os.path.expanduser(repo['path'])
+        try:
+            clients[key] = hglib.open(path)
+            rows[key] = local_state(cfg, clients[key])
+        except (hglib.error.ServerError, hglib.error.CommandError) as e:
+            rows[key] = {'error': cfg.dec(str(e))}
+            continue
+        try:
+            watcher.add(key, path)
+        except OSError as e:
+            # e.g. the inotify watches limit is reached
+            cfg.vlog('inotify: {}, polling instead'.format(e))
+            watcher.close()
+            watcher = PollingWatcher()
+            for k in clients:
+                watcher.add(k, os.path.expanduser(cfg.repositores[k]['path']))
+
+    # the remote checks may take minutes, the table is updated as they finish
+    executor = ThreadPoolExecutor(jobs)
+    pending = {}
+    remote_at = 0
+    render(cfg, cfg.repositores, rows)
+    try:
+        while True:
+            if not pending and time.time() >= remote_at:
+                pending = {
+                    executor.submit(remote_state, cfg, cfg.repositores[key]): key
+                    for key in clients
+                }
+                remote_at = time.time() + remote_interval
+            timeout = 0.5 if pending else remote_at - time.time()
+            updated = False
+            for key in watcher.wait(timeout):
+                row = dict(rows[key])
+                try:
+                    rows[key].update(local_state(cfg, clients[key]))
+                    rows[key].pop('error', None)
+                except hglib.error.CommandError as e:
+                    rows[key]['error'] = cfg.dec(str(e))
+                # the polling watcher reports all repositories every time
+                updated = updated or rows[key] != row
+            done = [future for future in pending if future.done()]
+            for future in done:
+                rows[pending.pop(future)].update(future.result())
+            if updated or done:
+                render(cfg, cfg.repositores, rows)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+        watcher.close()
+        for hg in clients.values():
+            hg.close()
@@ -1,9 +1,13 @@
+import hashlib
 import os
 import sys
 
 import click
 import configparser
 import hglib
+from ju.cache import cache_dir, ensure_dir, file_lock
+from ju.prefetch import Schedule
+from ju.workspace import Workspace
 
 
 class Config(object):
@@ -12,10 +16,18 @@ class Config(object):
     def __init__(self):
         self.verbose = False
         self.config_path = os.path.expanduser('~/.jurc')
+        self.cache_dir = cache_dir()
         self.aliases = {}
         self.jira_cfg = {}
+        self.prefetch_cfg = {}
         self.repositores = []
         self.read_config(self.config_path)
+        self.schedule = Schedule(
+            os.path.join(self.cache_dir, 'prefetch.json'),
+            interval=int(self.prefetch_cfg.get('interval', 600)),
+            min_interval=int(self.prefetch_cfg.get('min_interval', 60)),
+            max_interval=int(self.prefetch_cfg.get('max_interval', 6 * 3600)),
+        )
 
     def read_config(self, filename):
         if not os.path.isfile(filename):
@@ -26,13 +38,46 @@ class Config(object):
             parser.read([filename])
             self.jira_cfg.update(parser.items('jira'))
             self.aliases.update(parser.items('aliases'))
+            if parser.has_section('prefetch'):
+                self.prefetch_cfg.update(parser.items('prefetch'))
             for k, v in parser.items():
                 if k.startswith('repository:'):
                     self.repositores.append(v)
+            if parser.has_section('workspace'):
+                self.read_workspace(parser)
         except Exception as e:
             self.err(e)
             exit()
 
+    def read_workspace(self, parser):
+        """Adds repositories discovered under the `[workspace]` roots."""
+        section = parser['workspace']
+        split = lambda value: [
+            x.strip() for x in value.replace(',', '\n').split('\n') if x.strip()
+        ]
+        workspace = Workspace(
+            roots=split(section.get('roots', '')),
+            ignore=split(section.get('ignore', '')),
+            depth=section.getint('depth'),
+            cache_path=os.path.join(self.cache_dir, 'workspace.json'),
+        )
+        known = set(
+            os.path.realpath(os.path.expanduser(repo['path']))
+            for repo in self.repositores
+        )
+        paths = [path for path in workspace.discover() if path not in known]
+        names = [workspace.name(path) for path in paths]
+        for path, name in zip(paths, names):
+            # the same name under another root or in an explicit section
+            if names.count(name) > 1 or parser.has_section('repository:' + name):
+                name = workspace.name(path, qualified=True)
+            name = 'repository:{}'.format(name)
+            if parser.has_section(name):
+                self.err('Repository {} is skipped, "{}" is already used'.format(path, name))
+                continue
+            parser.read_dict({name: {'path': path.replace('%', '%%')}}, source='<workspace>')
+            self.repositores.append(parser[name])
+
     def hg_init(self, repo, branch=None, quiet=False):
         dec = self.dec
         out = self.vlog if quiet else self.out
@@ -42,10 +87,19 @@ class Config(object):
             hg = hglib.open(repo['path'])
             if not branch:
                 branch = dec(hg.branch())
-            if hg.incoming():
-                prefix = dec(hg.paths()[b'default'])
-                out('comparing with {}'.format(prefix))
-                hg.pull()
+            with self.bundle_lock(repo):
+                # bundle left by `ju incoming` or `ju watch`
+                self.pull_bundle(hg, repo)
+                fresh = int(self.prefetch_cfg.get('fresh', 300))
+                if self.schedule.is_fresh(repo.name, fresh):
+                    out('prefetched {}s ago, not checking incoming'.format(
+                        int(self.schedule.age(repo.name))
+                    ), bold=False)
+                elif self.fetch_incoming(hg, repo):
+                    prefix = dec(hg.paths()[b'default'])
+                    out('comparing with {}'.format(prefix))
+                    if not self.pull_bundle(hg, repo):
+                        hg.pull()
         except hglib.error.ServerError as e:
             err('\n======> {} <======'.format(repo.name))
             print(type(e))
@@ -54,6 +108,80 @@ class Config(object):
             out('\n======> {}({}) <======'.format(repo.name, branch), fg='green')
             return hg
 
+    def bundle_path(self, repo):
+        """Path of the bundle with incoming changesets of the repository.
+
+        Keyed on the repository location, so two repositories never share
+        a bundle or its lock.
+        """
+        path = os.path.realpath(os.path.expanduser(repo['path']))
+        digest = hashlib.sha1(self.enc(path)).hexdigest()[:16]
+        name = '{}-{}.hg'.format(os.path.basename(path), digest)
+        return os.path.join(self.cache_dir, 'bundles', name)
+
+    def bundle_lock(self, repo):
+        """Lock to hold while the repository bundle is fetched or pulled."""
+        return file_lock(self.bundle_path(repo) + '.lock')
+
+    def fetch_incoming(self, hg, repo):
+        """Returns incoming changesets and saves them to the repository bundle,
+        so the following pull doesn't transfer them again.
+        Must be called holding `bundle_lock`.
+        """
+        path = self.bundle_path(repo)
+        ensure_dir(os.path.dirname(path))
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        try:
+            changesets = hg.incoming(bundle=self.enc(tmp))
+            if changesets:
+                os.replace(tmp, path)
+            else:
+                self.drop_bundle(repo)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return changesets
+
+    def pull_bundle(self, hg, repo):
+        """Pulls changesets from the repository bundle, returns how many were
+        applied, 0 if there is no bundle or it can't be applied.
+        Must be called holding `bundle_lock`.
+        """
+        path = self.bundle_path(repo)
+        if not os.path.isfile(path):
+            return 0
+        try:
+            # reads the bundle only, doesn't touch the network
+            nodes = [self.dec(rev.node) for rev in hg.incoming(path=self.enc(path))]
+            if not nodes:
+                return 0
+            hg.pull(source=self.enc(path))
+        except hglib.error.CommandError as e:
+            # e.g. the bundle base revisions were stripped since
+            self.vlog('can\'t pull from bundle: {}'.format(e))
+            return 0
+        finally:
+            self.drop_bundle(repo)
+        self.pull_phases(hg, nodes)
+        return len(nodes)
+
+    def pull_phases(self, hg, nodes):
+        """A bundle holds changesets only, so pulls remote bookmarks and
+        phases for them. No changesets are transferred, they are all local.
+        """
+        revset = 'heads({})'.format(' + '.join(nodes))
+        heads = [rev.node for rev in hg.log(revrange=self.enc(revset))]
+        try:
+            hg.pull(rev=heads)
+        except hglib.error.CommandError as e:
+            self.vlog('can\'t pull bookmarks and phases: {}'.format(e))
+
+    def drop_bundle(self, repo):
+        try:
+            os.remove(self.bundle_path(repo))
+        except OSError:
+            pass
+
     def out(self, msg, **kwargs):
         """Out messages to stdout."""
         options = dict(bold=True, err=True)
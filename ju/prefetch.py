@@ -0,0 +1,86 @@
+import random
+import time
+
+from ju.cache import load_json, dump_json, file_lock
+
+
+class Schedule(object):
+    """Keeps when each repository was prefetched and when it's due again.
+
+    Repositories which receive changes are checked more often, idle and
+    failing ones are backed off up to `max_interval` seconds.
+    """
+    jitter = 0.1
+
+    def __init__(self, path, interval=600, min_interval=60, max_interval=6 * 3600):
+        self.path = path
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.entries = load_json(path, {})
+        # repositories recorded by this process, only they are saved
+        self.dirty = set()
+
+    def entry(self, name):
+        return self.entries.setdefault(name, {
+            'interval': self.interval,
+            'next': 0,
+            'failures': 0,
+        })
+
+    def is_due(self, name, now=None):
+        now = now or time.time()
+        return self.entries.get(name, {}).get('next', 0) <= now
+
+    def is_fresh(self, name, max_age, now=None):
+        """True if the repository was prefetched less than `max_age` seconds
+        ago, so other commands don't need to check it. The window doesn't
+        grow with the backoff, and failing repositories are never fresh.
+        """
+        now = now or time.time()
+        entry = self.entries.get(name)
+        if not entry or entry.get('failures') or 'last_success' not in entry:
+            return False
+        return now - entry['last_success'] < max_age
+
+    def age(self, name, now=None):
+        """Seconds since the last successful prefetch of the repository."""
+        now = now or time.time()
+        return now - self.entries[name]['last_success']
+
+    def next_run(self, names):
+        """Time when the first of the repositories will be due."""
+        return min(self.entries.get(name, {}).get('next', 0) for name in names)
+
+    def record(self, name, changes=0, error=None, now=None):
+        """Updates the repository schedule with a prefetch result."""
+        now = now or time.time()
+        entry = self.entry(name)
+        self.dirty.add(name)
+        entry['last_attempt'] = now
+        if error is not None:
+            entry['failures'] += 1
+            entry['error'] = error
+            delay = min(self.max_interval, self.min_interval * 2 ** entry['failures'])
+        else:
+            entry['failures'] = 0
+            entry.pop('error', None)
+            entry['last_success'] = now
+            entry['changes'] = changes
+            if changes:
+                entry['last_change'] = now
+                entry['interval'] = max(self.min_interval, entry['interval'] / 2.0)
+            else:
+                entry['interval'] = min(self.max_interval, entry['interval'] * 1.5)
+            delay = entry['interval']
+        entry['next'] = now + delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def save(self):
+        # cron and --loop runs may overlap, keep what they recorded
+        with file_lock(self.path + '.lock'):
+            entries = load_json(self.path, {})
+            for name in self.dirty:
+                entries[name] = self.entries[name]
+            dump_json(self.path, entries)
+        self.entries = entries
+        self.dirty.clear()
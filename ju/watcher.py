@@ -0,0 +1,197 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+# files inside .hg that change the status of a working copy
+HG_FILES = {
+    'dirstate', 'branch', 'bookmarks', 'bookmarks.current', 'phaseroots',
+    '00changelog.i',
+}
+
+
+def is_temp_file(name):
+    """Editor swap and backup files, saving them changes nothing for hg."""
+    return (
+        name.endswith(('~', '.swp', '.swo', '.swx')) or
+        name.startswith(('.#', '#')) or
+        name == '4913'  # vim checks if it can write to the directory
+    )
+
+
+def list_dirs(path):
+    """Returns the subdirectories of `path` except `.hg`."""
+    with os.scandir(path) as entries:
+        return sorted(
+            entry.name for entry in entries
+            if entry.is_dir(follow_symlinks=False) and entry.name != '.hg'
+        )
+
+
+def walk_dirs(path):
+    """Yields all the working copy directories."""
+    stack = [path]
+    while stack:
+        root = stack.pop()
+        try:
+            subdirs = list_dirs(root)
+        except OSError:
+            continue
+        yield root
+        stack.extend(os.path.join(root, d) for d in subdirs)
+
+
+class PollingWatcher(object):
+    """Reports every repository as changed each `interval` seconds, so its
+    status is queried again through the open command server. hg checks
+    the files against the dirstate, which also catches in-place edits.
+    """
+
+    def __init__(self, interval=2.0):
+        self.interval = interval
+        self.keys = set()
+        self.polled_at = time.time()
+
+    def add(self, key, path):
+        self.keys.add(key)
+
+    def wait(self, timeout):
+        """Blocks up to `timeout` seconds, returns the keys to query again."""
+        remaining = self.polled_at + self.interval - time.time()
+        if remaining > timeout:
+            time.sleep(max(timeout, 0))
+            return set()
+        time.sleep(max(remaining, 0))
+        self.polled_at = time.time()
+        return set(self.keys)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """Detects changes with linux inotify, so idle repositories cost nothing."""
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+    MASK = (
+        IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+        IN_CREATE | IN_DELETE | IN_DELETE_SELF
+    )
+    EVENT = struct.Struct('iIII')
+    # events arriving this soon after the previous one are handled together,
+    # but for no longer than `max_debounce` so steady writers can't stall us
+    debounce = 0.1
+    max_debounce = 0.5
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError(errno.ENOSYS, 'libc not found')
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify is not supported')
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            self.raise_errno()
+        self.watches = {}  # wd -> (key, path, is_hg)
+        self.roots = {}
+
+    def raise_errno(self):
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code))
+
+    def add_watch(self, key, path, is_hg=False):
+        wd = self.libc.inotify_add_watch(
+            self.fd, os.fsencode(path), self.MASK
+        )
+        if wd < 0:
+            self.raise_errno()
+        self.watches[wd] = (key, path, is_hg)
+
+    def add_tree(self, key, path):
+        for root in walk_dirs(path):
+            self.add_watch(key, root)
+
+    def add(self, key, path):
+        self.roots[key] = path
+        self.add_tree(key, path)
+        for dirname in ('.hg', os.path.join('.hg', 'store')):
+            hg_path = os.path.join(path, dirname)
+            if os.path.isdir(hg_path):
+                self.add_watch(key, hg_path, is_hg=True)
+
+    def read_events(self):
+        changed = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return changed
+            raise
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                changed.update(self.roots)
+                continue
+            if wd not in self.watches:
+                continue
+            key, path, is_hg = self.watches[wd]
+            if is_hg:
+                # lock files and journals are written by every hg command
+                if name in HG_FILES:
+                    changed.add(key)
+                continue
+            if name == '.hg' or is_temp_file(name):
+                continue
+            if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                try:
+                    self.add_tree(key, os.path.join(path, name))
+                except OSError:
+                    pass
+            changed.add(key)
+        return changed
+
+    def wait(self, timeout):
+        """Blocks up to `timeout` seconds, returns the keys which changed."""
+        deadline = time.time() + max(timeout, 0)
+        readable, _, _ = select.select([self.fd], [], [], max(timeout, 0))
+        if not readable:
+            return set()
+        changed = self.read_events()
+        deadline = min(deadline, time.time() + self.max_debounce)
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            if not select.select([self.fd], [], [], min(self.debounce, remaining))[0]:
+                break
+            changed |= self.read_events()
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def make_watcher(poll=False, interval=2.0):
+    """Returns an inotify watcher, or a polling one where it's unavailable."""
+    if not poll:
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(interval)
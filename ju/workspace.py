@@ -0,0 +1,105 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from ju.cache import load_json, dump_json
+
+
+class Workspace(object):
+    """Discovers mercurial repositories under the workspace roots.
+
+    Every scanned directory is cached with its mtime, so the next run
+    only lists directories that have changed since then.
+    """
+    ignore = (
+        'node_modules', 'bower_components', 'vendor', 'site-packages',
+        '__pycache__', 'venv', 'env',
+    )
+    depth = 4
+    workers = 8
+
+    def __init__(self, roots, cache_path, ignore=(), depth=None):
+        self.roots = sorted(set(
+            os.path.realpath(os.path.expanduser(root)) for root in roots
+        ))
+        self.ignore = set(self.ignore) | set(ignore)
+        if depth is not None:
+            self.depth = depth
+        self.cache_path = cache_path
+        self.cache = {}
+
+    @property
+    def key(self):
+        return [self.roots, sorted(self.ignore), self.depth]
+
+    def is_ignored(self, name):
+        return name.startswith('.') or name in self.ignore
+
+    def name(self, path, qualified=False):
+        """Returns the repository name relative to its workspace root,
+        prefixed with the root name if `qualified`.
+        """
+        for root in self.roots:
+            if path.startswith(root + os.sep):
+                name = os.path.relpath(path, root)
+                if qualified:
+                    name = os.path.join(os.path.basename(root), name)
+                return name
+        return os.path.basename(path)
+
+    def scan(self, path):
+        """Returns `[mtime, is_repo, subdirs]` for a directory."""
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        cached = self.cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached
+        is_repo = False
+        subdirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    if entry.name == '.hg':
+                        is_repo = True
+                    elif not self.is_ignored(entry.name):
+                        subdirs.append(entry.name)
+        except OSError:
+            return None
+        # nested repositories (subrepos) are not walked
+        return [mtime, is_repo, [] if is_repo else sorted(subdirs)]
+
+    def discover(self):
+        """Returns a sorted list of repository paths under the roots."""
+        cached = load_json(self.cache_path, {})
+        if cached.get('key') == self.key:
+            self.cache = cached.get('dirs', {})
+
+        dirs = {}
+        repos = []
+        level = [root for root in self.roots if os.path.isdir(root)]
+        with ThreadPoolExecutor(self.workers) as executor:
+            for depth in range(self.depth + 1):
+                if not level:
+                    break
+                next_level = []
+                for path, result in zip(level, executor.map(self.scan, level)):
+                    if result is None:
+                        continue
+                    dirs[path] = result
+                    mtime, is_repo, subdirs = result
+                    if is_repo:
+                        repos.append(path)
+                    elif depth < self.depth:
+                        next_level.extend(os.path.join(path, d) for d in subdirs)
+                level = next_level
+
+        if dirs != self.cache:
+            try:
+                dump_json(self.cache_path, {'key': self.key, 'dirs': dirs})
+            except (IOError, OSError):
+                pass
+        self.cache = dirs
+        return sorted(repos)
@@ -23,6 +23,6 @@ setup(
         'python-hglib',
         'colorama'
     ],
-    python_requires=">=2.7.14, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*, <4",
+    python_requires=">=3.6, <4",
     entry_points={"console_scripts": ["ju=ju.cli:cli"]}
 )